@@ -1,11 +1,121 @@
 import argparse
+import json
+import math
 import sys
+from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 
-from prettytable import PrettyTable
-
+from ..core.currencies import canonical_code
 from ..core.usecases import CurrencyService, SessionManager, TradingService, UserManager
 
+# Шаблоны сообщений о сделках (заполняются словарем результата сделки)
+_BUY_MSG = (
+    "Покупка выполнена: {amount:.4f} {currency} "
+    "по курсу {rate:.2f} USD/{currency}"
+)
+_SELL_MSG = (
+    "Продажа выполнена: {amount:.4f} {currency} "
+    "по курсу {rate:.2f} USD/{currency}"
+)
+_BALANCE_CHANGE_MSG = (
+    "Изменения в портфеле:\n"
+    "  - {currency}: было {old_balance:.4f} → стало {new_balance:.4f}"
+)
+_BUY_COST_MSG = "Оценочная стоимость покупки: {total_cost:,.2f} USD"
+_SELL_INCOME_MSG = "Оценочная выручка: {total_income:,.2f} USD"
+
+
+@lru_cache(maxsize=1024)
+def _format_timestamp(iso_timestamp: str) -> str:
+    """Форматирует ISO-метку времени для вывода (с кешированием)."""
+    return datetime.fromisoformat(iso_timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@lru_cache(maxsize=None)
+def _build_parser() -> argparse.ArgumentParser:
+    """Строит парсер аргументов командной строки (один раз за процесс)."""
+    parser = argparse.ArgumentParser(
+        description="ValutaTrade Hub - Валютный кошелек"
+    )
+    subparsers = parser.add_subparsers(
+        dest="command", help="Доступные команды"
+    )
+
+    # register command
+    register_parser = subparsers.add_parser(
+        "register", help="Регистрация нового пользователя"
+    )
+    register_parser.add_argument(
+        "--username", required=True, help="Имя пользователя"
+    )
+    register_parser.add_argument(
+        "--password", required=True, help="Пароль"
+    )
+
+    # login command
+    login_parser = subparsers.add_parser("login", help="Вход в систему")
+    login_parser.add_argument(
+        "--username", required=True, help="Имя пользователя"
+    )
+    login_parser.add_argument(
+        "--password", required=True, help="Пароль"
+    )
+
+    # logout command
+    subparsers.add_parser("logout", help="Выход из системы")
+
+    # show-portfolio command
+    portfolio_parser = subparsers.add_parser(
+        "show-portfolio", help="Показать портфеле"
+    )
+    portfolio_parser.add_argument(
+        "--base", default="USD", help="Базовая валюта (по умолчанию USD)"
+    )
+
+    # buy command
+    buy_parser = subparsers.add_parser("buy", help="Купить валюту")
+    buy_parser.add_argument(
+        "--currency", required=True, help="Код покупаемой валюты"
+    )
+    buy_parser.add_argument(
+        "--amount", type=float, required=True,
+        help="Количество покупаемой валюты"
+    )
+
+    # sell command
+    sell_parser = subparsers.add_parser("sell", help="Продать валюту")
+    sell_parser.add_argument(
+        "--currency", required=True, help="Код продаваемой валюты"
+    )
+    sell_parser.add_argument(
+        "--amount", type=float, required=True,
+        help="Количество продаваемой валюты"
+    )
+
+    # batch command
+    batch_parser = subparsers.add_parser(
+        "batch", help="Выполнить серию сделок из файла"
+    )
+    batch_parser.add_argument(
+        "--file", required=True,
+        help="JSON-файл со списком заявок {action, currency, amount}"
+    )
+
+    # get-rate command
+    rate_parser = subparsers.add_parser(
+        "get-rate", help="Получить курс валюты"
+    )
+    rate_parser.add_argument(
+        "--from", required=True, dest="from_currency",
+        help="Исходная валюта"
+    )
+    rate_parser.add_argument(
+        "--to", required=True, help="Целевая валюта"
+    )
+
+    return parser
+
 
 class CLI:
     """Командный интерфейс для валютного кошелька."""
@@ -31,76 +141,7 @@ class CLI:
 
     def run(self):
         """Запускает CLI интерфейс."""
-        parser = argparse.ArgumentParser(
-            description="ValutaTrade Hub - Валютный кошелек"
-        )
-        subparsers = parser.add_subparsers(
-            dest="command", help="Доступные команды"
-        )
-
-        # register command
-        register_parser = subparsers.add_parser(
-            "register", help="Регистрация нового пользователя"
-        )
-        register_parser.add_argument(
-            "--username", required=True, help="Имя пользователя"
-        )
-        register_parser.add_argument(
-            "--password", required=True, help="Пароль"
-        )
-
-        # login command
-        login_parser = subparsers.add_parser("login", help="Вход в систему")
-        login_parser.add_argument(
-            "--username", required=True, help="Имя пользователя"
-        )
-        login_parser.add_argument(
-            "--password", required=True, help="Пароль"
-        )
-
-        # logout command
-        subparsers.add_parser("logout", help="Выход из системы")
-
-        # show-portfolio command
-        portfolio_parser = subparsers.add_parser(
-            "show-portfolio", help="Показать портфеле"
-        )
-        portfolio_parser.add_argument(
-            "--base", default="USD", help="Базовая валюта (по умолчанию USD)"
-        )
-
-        # buy command
-        buy_parser = subparsers.add_parser("buy", help="Купить валюту")
-        buy_parser.add_argument(
-            "--currency", required=True, help="Код покупаемой валюты"
-        )
-        buy_parser.add_argument(
-            "--amount", type=float, required=True,
-            help="Количество покупаемой валюты"
-        )
-
-        # sell command
-        sell_parser = subparsers.add_parser("sell", help="Продать валюту")
-        sell_parser.add_argument(
-            "--currency", required=True, help="Код продаваемой валюты"
-        )
-        sell_parser.add_argument(
-            "--amount", type=float, required=True,
-            help="Количество продаваемой валюты"
-        )
-
-        # get-rate command
-        rate_parser = subparsers.add_parser(
-            "get-rate", help="Получить курс валюты"
-        )
-        rate_parser.add_argument(
-            "--from", required=True, dest="from_currency",
-            help="Исходная валюта"
-        )
-        rate_parser.add_argument(
-            "--to", required=True, help="Целевая валюта"
-        )
-
+        parser = _build_parser()
         args = parser.parse_args()
 
         if not args.command:
@@ -115,19 +156,9 @@ class CLI:
 
     def _handle_command(self, args):
         """Обрабатывает команды."""
-        command_handlers = {
-            "register": self._handle_register,
-            "login": self._handle_login,
-            "logout": self._handle_logout,
-            "show-portfolio": self._handle_show_portfolio,
-            "buy": self._handle_buy,
-            "sell": self._handle_sell,
-            "get-rate": self._handle_get_rate,
-        }
-
-        handler = command_handlers.get(args.command)
+        handler = self._HANDLERS.get(args.command)
         if handler:
-            handler(args)
+            handler(self, args)
         else:
             print(f"Неизвестная команда: {args.command}")
 
@@ -167,22 +198,13 @@ class CLI:
         if args.amount <= 0:
             raise ValueError("'amount' должен быть положительным числом")
 
+        currency = canonical_code(args.currency)
         result = self.trading_service.buy_currency(
             self.current_user["id"],
-            args.currency.upper(),
+            currency,
             args.amount
         )
-
-        print(
-            f"Покупка выполнена: {args.amount:.4f} {args.currency.upper()} "
-            f"по курсу {result['rate']:.2f} USD/{args.currency.upper()}"
-        )
-        print("Изменения в портфеле:")
-        print(
-            f"  - {args.currency.upper()}: было {result['old_balance']:.4f} → "
-            f"стало {result['new_balance']:.4f}"
-        )
-        print(f"Оценочная стоимость покупки: {result['total_cost']:,.2f} USD")
+        self._print_buy(result)
 
     def _handle_sell(self, args):
         """Обрабатывает команду sell."""
@@ -192,44 +214,80 @@ class CLI:
         if args.amount <= 0:
             raise ValueError("'amount' должен быть положительным числом")
 
+        currency = canonical_code(args.currency)
         result = self.trading_service.sell_currency(
             self.current_user["id"],
-            args.currency.upper(),
+            currency,
             args.amount
         )
+        self._print_sell(result)
 
-        print(
-            f"Продажа выполнена: {args.amount:.4f} {args.currency.upper()} "
-            f"по курсу {result['rate']:.2f} USD/{args.currency.upper()}"
-        )
-        print("Изменения в портфеле:")
-        print(
-            f"  - {args.currency.upper()}: было {result['old_balance']:.4f} → "
-            f"стало {result['new_balance']:.4f}"
-        )
-        print(f"Оценочная выручка: {result['total_income']:,.2f} USD")
+    def _handle_batch(self, args):
+        """Обрабатывает команду batch."""
+        if not self.current_user:
+            raise ValueError("Сначала выполните login")
+
+        with open(args.file, 'r', encoding='utf-8') as f:
+            orders_data = json.load(f)
+        if not isinstance(orders_data, list):
+            raise ValueError("Файл заявок должен содержать список операций")
+
+        orders = []
+        for order in orders_data:
+            try:
+                amount = order["amount"]
+                # bool — подкласс int, а float() пропускает NaN и бесконечность
+                if isinstance(amount, bool):
+                    raise TypeError(amount)
+                amount = float(amount)
+                if not math.isfinite(amount):
+                    raise ValueError(amount)
+                orders.append({
+                    "action": order["action"],
+                    "currency": canonical_code(order["currency"]),
+                    "amount": amount
+                })
+            except (AttributeError, KeyError, TypeError, ValueError):
+                raise ValueError(f"Некорректная заявка: {order}")
+
+        results = self.trading_service.batch_trade(self.current_user["id"], orders)
+
+        for result in results:
+            if result["action"] == "buy":
+                self._print_buy(result)
+            else:
+                self._print_sell(result)
+        print(f"Выполнено операций: {len(results)}")
+
+    def _print_buy(self, result):
+        """Выводит результат покупки."""
+        print(_BUY_MSG.format_map(result))
+        print(_BALANCE_CHANGE_MSG.format_map(result))
+        print(_BUY_COST_MSG.format_map(result))
+
+    def _print_sell(self, result):
+        """Выводит результат продажи."""
+        print(_SELL_MSG.format_map(result))
+        print(_BALANCE_CHANGE_MSG.format_map(result))
+        print(_SELL_INCOME_MSG.format_map(result))
 
     def _handle_get_rate(self, args):
         """Обрабатывает команду get-rate."""
-        from_currency = getattr(args, "from_currency").upper()
-        to_currency = args.to.upper()
+        from_currency = canonical_code(getattr(args, "from_currency"))
+        to_currency = canonical_code(args.to)
+
+        rates_data = self.currency_service._load_rates()
 
         try:
             rate = self.currency_service.get_exchange_rate(
-                from_currency, to_currency
+                from_currency, to_currency, rates_data
             )
 
             # Получаем время обновления
-            rates_data = self.currency_service._load_rates()
             pair_key = f"{from_currency}_{to_currency}"
             updated_at = rates_data.get(pair_key, {}).get("updated_at")
 
-            if updated_at:
-                from datetime import datetime
-                dt = datetime.fromisoformat(updated_at)
-                time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                time_str = "неизвестно"
+            time_str = _format_timestamp(updated_at) if updated_at else "неизвестно"
 
             print(
                 f"Курс {from_currency}→{to_currency}: {rate:.8f} "
@@ -250,7 +308,7 @@ class CLI:
             raise ValueError("Сначала выполните login")
 
         portfolio = self.user_manager.get_user_portfolio(self.current_user["id"])
-        base_currency = args.base.upper()
+        base_currency = canonical_code(args.base)
 
         # Проверяем валидность базовой валюты
         try:
@@ -267,36 +325,42 @@ class CLI:
             print("  У вас пока нет кошельков")
             return
 
+        # prettytable нужна только этой команде, импортируем по требованию
+        from prettytable import PrettyTable
+
         table = PrettyTable()
         table.field_names = ["Валюта", "Баланс", f"Стоимость ({base_currency})"]
         table.align = "r"
         table.align["Валюта"] = "l"
 
-        for currency_code, wallet in portfolio.wallets.items():
-            try:
-                if currency_code == base_currency:
-                    value = wallet.balance
-                else:
-                    rate = self.currency_service.get_exchange_rate(
-                        currency_code, base_currency
-                    )
-                    value = wallet.balance * rate
-
-                table.add_row([
-                    currency_code,
-                    f"{wallet.balance:.4f}",
-                    f"{value:.2f}"
-                ])
-            except ValueError:
-                table.add_row([
-                    currency_code,
-                    f"{wallet.balance:.4f}",
-                    "неизвестно"
-                ])
+        values = self.trading_service.revalue_portfolio(portfolio, base_currency)
+
+        table.add_rows([
+            [
+                currency_code,
+                f"{wallet.balance:.4f}",
+                "неизвестно" if value is None else f"{value:.2f}"
+            ]
+            for (currency_code, wallet), value in zip(
+                portfolio.wallets.items(), values.values()
+            )
+        ])
 
         print(table)
         print(f"{'ИТОГО:':>20} {total_value:,.2f} {base_currency}")
 
+    # Таблица диспетчеризации: имя команды -> обработчик
+    _HANDLERS = {
+        "register": _handle_register,
+        "login": _handle_login,
+        "logout": _handle_logout,
+        "show-portfolio": _handle_show_portfolio,
+        "buy": _handle_buy,
+        "sell": _handle_sell,
+        "batch": _handle_batch,
+        "get-rate": _handle_get_rate,
+    }
+
 
 def main():
     """Точка входа для CLI."""
@@ -1,17 +1,30 @@
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping
 from .exceptions import CurrencyNotFoundError
 
 
+@lru_cache(maxsize=256)
+def canonical_code(code: str) -> str:
+    """Приводит код валюты к верхнему регистру (интернированная строка)."""
+    return sys.intern(code.upper())
+
+
 class Currency(ABC):
     """Абстрактный базовый класс для валют."""
 
+    __slots__ = ("_name", "_code", "_hash")
+
     def __init__(self, name: str, code: str):
         self._validate_code(code)
         self._validate_name(name)
         
         self._name = name
-        self._code = code.upper()
+        self._code = canonical_code(code)
+        # Код неизменяем после создания, поэтому хеш считаем один раз
+        self._hash = hash(self._code)
 
     def _validate_code(self, code: str) -> None:
         """Валидирует код валюты."""
@@ -54,12 +67,14 @@ class Currency(ABC):
         return self._code == other.code
 
     def __hash__(self) -> int:
-        return hash(self._code)
+        return self._hash
 
 
 class FiatCurrency(Currency):
     """Класс для фиатных валют."""
 
+    __slots__ = ("_issuing_country",)
+
     def __init__(self, name: str, code: str, issuing_country: str):
         super().__init__(name, code)
         self._issuing_country = issuing_country
@@ -77,6 +92,8 @@ class FiatCurrency(Currency):
 class CryptoCurrency(Currency):
     """Класс для криптовалют."""
 
+    __slots__ = ("_algorithm", "_market_cap")
+
     def __init__(self, name: str, code: str, algorithm: str, market_cap: float = 0.0):
         super().__init__(name, code)
         self._algorithm = algorithm
@@ -110,6 +127,7 @@ class CryptoCurrency(Currency):
 
 # Реестр валют
 _currency_registry: Dict[str, Currency] = {}
+_registry_view: Mapping[str, Currency] = MappingProxyType(_currency_registry)
 
 
 def _initialize_currency_registry() -> None:
@@ -142,10 +160,7 @@ def _initialize_currency_registry() -> None:
 
 def get_currency(code: str) -> Currency:
     """Возвращает валюту по коду."""
-    if not _currency_registry:
-        _initialize_currency_registry()
-    
-    code_upper = code.upper()
+    code_upper = canonical_code(code)
     if code_upper not in _currency_registry:
         raise CurrencyNotFoundError(f"Валюта с кодом '{code}' не найдена")
     
@@ -157,8 +172,14 @@ def register_currency(currency: Currency) -> None:
     _currency_registry[currency.code] = currency
 
 
-def get_all_currencies() -> Dict[str, Currency]:
-    """Возвращает все зарегистрированные валюты."""
-    if not _currency_registry:
-        _initialize_currency_registry()
-    return _currency_registry.copy()
\ No newline at end of file
+def get_all_currencies() -> Mapping[str, Currency]:
+    """Возвращает все зарегистрированные валюты (представление только для чтения)."""
+    return _registry_view
+
+
+def snapshot_currencies() -> Dict[str, Currency]:
+    """Возвращает изменяемую копию реестра валют."""
+    return _currency_registry.copy()
+
+
+_initialize_currency_registry()
@@ -1,10 +1,60 @@
 import hashlib
+import hmac
+import operator
+import secrets
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping
+
+from .currencies import canonical_code
+
+# Алгоритм хеширования паролей: scrypt (требует много памяти на каждую
+# проверку, что затрудняет перебор). "sha256" — старый формат записей.
+PASSWORD_ALGO = "scrypt"
+LEGACY_PASSWORD_ALGO = "sha256"
+_SCRYPT_N = 2 ** 14
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+_SCRYPT_DKLEN = 32
+
+# Фиксированные курсы для демонстрации (стоимость единицы валюты в USD)
+_EXCHANGE_RATES = {
+    'USD': 1.0,
+    'EUR': 0.85,
+    'GBP': 0.73,
+    'JPY': 110.0,
+    'RUB': 80.0,
+    'BTC': 100000.0,  # 1 BTC = 100000 USD
+    'ETH': 3000.0    # 1 ETH = 3000 USD
+}
+
+
+@lru_cache(maxsize=None)
+def _conversion_factors(base_currency: str) -> Dict[str, float]:
+    """Возвращает множители пересчета каждой валюты в базовую."""
+    base_rate = _EXCHANGE_RATES[base_currency]
+    return {code: rate / base_rate for code, rate in _EXCHANGE_RATES.items()}
+
+
+def _sum_valued(balances: List[float], factors: List[float]) -> float:
+    """Возвращает сумму попарных произведений балансов и множителей."""
+    return sum(map(operator.mul, balances, factors))
 
 
 class User:
     """Класс пользователя системы валютного кошелька."""
 
+    __slots__ = (
+        "_user_id",
+        "_username",
+        "_salt",
+        "_salt_bytes",
+        "_hashed_password",
+        "_password_algo",
+        "_registration_date",
+    )
+
     def __init__(
         self,
         user_id: int,
@@ -16,6 +66,8 @@ class User:
         self._user_id = user_id
         self.username = username  # Используем сеттер для проверки
         self._salt = salt or self._generate_salt()
+        self._salt_bytes = self._salt.encode('utf-8')
+        self._password_algo = PASSWORD_ALGO
         self._hashed_password = self._hash_password(password)
         self._registration_date = registration_date or datetime.now()
 
@@ -32,16 +84,17 @@ class User:
     @username.setter
     def username(self, value: str) -> None:
         """Сеттер для имени пользователя с проверкой."""
-        if not value or not value.strip():
+        username = value.strip() if isinstance(value, str) else ""
+        if not username:
             raise ValueError("Имя пользователя не может быть пустым")
-        if len(value) < 3:
+        if len(username) < 3:
             raise ValueError("Имя пользователя должно быть не короче 3 символов")
-        self._username = value.strip()
+        self._username = username
 
     @property
     def hashed_password(self) -> str:
-        """Геттер для хешированного пароля."""
-        return self._hashed_password
+        """Геттер для хешированного пароля (в шестнадцатеричном виде)."""
+        return self._hashed_password.hex()
 
     @property
     def salt(self) -> str:
@@ -53,34 +106,52 @@ class User:
         """Геттер для даты регистрации."""
         return self._registration_date
 
+    @property
+    def needs_rehash(self) -> bool:
+        """Показывает, что пароль захеширован устаревшим алгоритмом."""
+        return self._password_algo != PASSWORD_ALGO
+
     def _generate_salt(self) -> str:
         """Генерирует случайную соль для хеширования пароля."""
-        import secrets
-        return secrets.token_hex(8)
+        return secrets.token_hex(16)
 
-    def _hash_password(self, password: str) -> str:
+    def _hash_password(self, password: str) -> bytes:
         """Хеширует пароль с использованием соли."""
         if len(password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
 
         password_bytes = password.encode('utf-8')
-        salt_bytes = self._salt.encode('utf-8')
-        hashed = hashlib.sha256(password_bytes + salt_bytes).hexdigest()
-        return hashed
+        if self._password_algo == LEGACY_PASSWORD_ALGO:
+            # Порядок данных (пароль, затем соль) совпадает со старыми записями
+            hasher = hashlib.sha256(password_bytes)
+            hasher.update(self._salt_bytes)
+            return hasher.digest()
+        return hashlib.scrypt(
+            password_bytes,
+            salt=self._salt_bytes,
+            n=_SCRYPT_N,
+            r=_SCRYPT_R,
+            p=_SCRYPT_P,
+            dklen=_SCRYPT_DKLEN
+        )
 
     def verify_password(self, password: str) -> bool:
         """Проверяет введенный пароль на совпадение."""
         try:
-            test_hash = self._hash_password(password)
-            return test_hash == self._hashed_password
+            return hmac.compare_digest(
+                self._hash_password(password), self._hashed_password
+            )
         except ValueError:
             return False
 
     def change_password(self, new_password: str) -> None:
-        """Изменяет пароль пользователя."""
+        """Изменяет пароль пользователя (новая соль, текущий алгоритм)."""
         if len(new_password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
 
+        self._salt = self._generate_salt()
+        self._salt_bytes = self._salt.encode('utf-8')
+        self._password_algo = PASSWORD_ALGO
         self._hashed_password = self._hash_password(new_password)
 
     def get_user_info(self) -> dict:
@@ -96,23 +167,28 @@ class User:
         return {
             "user_id": self._user_id,
             "username": self._username,
-            "hashed_password": self._hashed_password,
+            "hashed_password": self._hashed_password.hex(),
+            "algo": self._password_algo,
             "salt": self._salt,
             "registration_date": self._registration_date.isoformat()
         }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'User':
-        """Создает объект User из словаря (из JSON)."""
-        registration_date = datetime.fromisoformat(data["registration_date"])
-        user = cls(
-            user_id=data["user_id"],
-            username=data["username"],
-            password="temp",  # Временный пароль
-            salt=data["salt"],
-            registration_date=registration_date
-        )
-        user._hashed_password = data["hashed_password"]
+        """Создает объект User из словаря (из JSON).
+
+        Данные записаны самим приложением, поэтому повторная проверка имени
+        и хеширование временного пароля пропускаются.
+        """
+        user = cls.__new__(cls)
+        user._user_id = data["user_id"]
+        user._username = data["username"]
+        user._salt = data["salt"]
+        user._salt_bytes = user._salt.encode('utf-8')
+        user._hashed_password = bytes.fromhex(data["hashed_password"])
+        # Записи без поля algo созданы до перехода на scrypt
+        user._password_algo = data.get("algo", LEGACY_PASSWORD_ALGO)
+        user._registration_date = datetime.fromisoformat(data["registration_date"])
         return user
 
     def __str__(self) -> str:
@@ -128,6 +204,8 @@ class User:
 class Wallet:
     """Класс кошелька пользователя для конкретной валюты."""
 
+    __slots__ = ("_currency_code", "_balance")
+
     def __init__(self, currency_code: str, balance: float = 0.0):
         self.currency_code = currency_code  # Используем сеттер для проверки
         self.balance = balance  # Используем сеттер для проверки
@@ -144,7 +222,7 @@ class Wallet:
             raise ValueError("Код валюты должен быть непустой строкой")
         if len(value) != 3:
             raise ValueError("Код валюты должен состоять из 3 символов")
-        self._currency_code = value.upper()
+        self._currency_code = canonical_code(value)
 
     @property
     def balance(self) -> float:
@@ -167,7 +245,8 @@ class Wallet:
         if amount <= 0:
             raise ValueError("Сумма пополнения должна быть положительной")
 
-        self.balance += amount
+        # Сумма уже проверена, повторная проверка в сеттере не нужна
+        self._balance += amount
 
     def withdraw(self, amount: float) -> bool:
         """Снимает средства с кошелька, если баланс позволяет."""
@@ -178,7 +257,7 @@ class Wallet:
         if amount > self._balance:
             return False
 
-        self.balance -= amount
+        self._balance -= amount
         return True
 
     def get_balance_info(self) -> dict:
@@ -198,10 +277,15 @@ class Wallet:
     @classmethod
     def from_dict(cls, data: dict) -> 'Wallet':
         """Создает объект Wallet из словаря (из JSON)."""
-        return cls(
-            currency_code=data["currency_code"],
-            balance=data["balance"]
-        )
+        return cls._unchecked(data["currency_code"], data["balance"])
+
+    @classmethod
+    def _unchecked(cls, currency_code: str, balance: float) -> 'Wallet':
+        """Создает кошелек из доверенных данных без проверок в сеттерах."""
+        wallet = cls.__new__(cls)
+        wallet._currency_code = currency_code
+        wallet._balance = float(balance)
+        return wallet
 
     def __str__(self) -> str:
         """Строковое представление кошелька."""
@@ -214,8 +298,12 @@ class Wallet:
 class Portfolio:
     """Класс для управления всеми кошельками одного пользователя."""
 
+    __slots__ = ("_user_id", "_user_id_str", "_wallets")
+
     def __init__(self, user_id: int, wallets: dict[str, Wallet] = None):
         self._user_id = user_id
+        # Ключ портфеля в portfolios.json (ключи JSON-объектов — строки)
+        self._user_id_str = str(user_id)
         self._wallets = wallets or {}
 
     @property
@@ -224,16 +312,16 @@ class Portfolio:
         return self._user_id
 
     @property
-    def wallets(self) -> dict[str, Wallet]:
-        """Геттер для копии словаря кошельков."""
-        return self._wallets.copy()
+    def wallets(self) -> Mapping[str, Wallet]:
+        """Геттер для словаря кошельков (представление только для чтения)."""
+        return MappingProxyType(self._wallets)
 
     def add_currency(self, currency_code: str, initial_balance: float = 0.0) -> Wallet:
         """Добавляет новый кошелёк в портфель, если его ещё нет."""
         if not currency_code or not isinstance(currency_code, str):
             raise ValueError("Код валюты должен быть непустой строкой")
         
-        currency_code = currency_code.upper()
+        currency_code = canonical_code(currency_code)
         if currency_code in self._wallets:
             raise ValueError(f"Кошелёк с валютой {currency_code} уже существует")
         
@@ -243,45 +331,28 @@ class Portfolio:
 
     def get_wallet(self, currency_code: str) -> Wallet:
         """Возвращает объект Wallet по коду валюты."""
-        currency_code = currency_code.upper()
+        currency_code = canonical_code(currency_code)
         return self._wallets.get(currency_code)
 
     def get_total_value(self, base_currency: str = 'USD') -> float:
         """Возвращает общую стоимость всех валют в указанной базовой валюте."""
-        # Фиксированные курсы для демонстрации
-        exchange_rates = {
-            'USD': 1.0,
-            'EUR': 0.85,
-            'GBP': 0.73,
-            'JPY': 110.0,
-            'RUB': 80.0,
-            'BTC': 100000.0,  # 1 BTC = 100000 USD
-            'ETH': 3000.0    # 1 ETH = 3000 USD
-        }
-        
-        if base_currency not in exchange_rates:
+        if base_currency not in _EXCHANGE_RATES:
             raise ValueError(f"Неизвестная базовая валюта: {base_currency}")
-        
-        total_value = 0.0
-        
-        for currency_code, wallet in self._wallets.items():
-            if currency_code not in exchange_rates:
+
+        factors = _conversion_factors(base_currency)
+
+        # Балансы и множители — два параллельных списка одного порядка;
+        # валюты без курса получают множитель 0 и в сумму не входят
+        wallet_factors = []
+        for currency_code in self._wallets:
+            factor = factors.get(currency_code)
+            if factor is None:
                 print(f"Предупреждение: неизвестный курс для валюты {currency_code}")
-                continue
-            
-            # Конвертируем в базовую валюту
-            if currency_code == base_currency:
-                total_value += wallet.balance
-            else:
-                # Сначала конвертируем в USD, затем в базовую валюту
-                value_in_usd = wallet.balance * exchange_rates[currency_code]
-                if base_currency != 'USD':
-                    value_in_base = value_in_usd / exchange_rates[base_currency]
-                else:
-                    value_in_base = value_in_usd
-                total_value += value_in_base
-        
-        return round(total_value, 2)
+                factor = 0.0
+            wallet_factors.append(factor)
+        balances = [wallet._balance for wallet in self._wallets.values()]
+
+        return round(_sum_valued(balances, wallet_factors), 2)
 
     def buy_currency(
         self, 
@@ -308,7 +379,7 @@ class Portfolio:
             raise ValueError("USD кошелёк не найден для совершения покупки")
         
         # Проверяем достаточно ли средств в USD кошельке
-        if usd_wallet.balance < total_cost:
+        if usd_wallet._balance < total_cost:
             return False
         
         # Списываем с USD кошелька и пополняем целевой кошелек
@@ -343,7 +414,7 @@ class Portfolio:
             usd_wallet = self.add_currency('USD')
         
         # Проверяем достаточно ли средств в исходном кошельке
-        if source_wallet.balance < amount:
+        if source_wallet._balance < amount:
             return False
         
         # Списываем с исходного кошелька и пополняем USD кошелек
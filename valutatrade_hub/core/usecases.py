@@ -1,10 +1,170 @@
+import hashlib
+import hmac
 import json
+import math
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 
+from .currencies import canonical_code
 from .models import Portfolio, User
 
+# Заглушка курсов для демонстрации (стоимость единицы валюты в USD)
+_STUB_RATES = {
+    "USD": 1.0,
+    "EUR": 0.85,
+    "GBP": 0.73,
+    "JPY": 110.0,
+    "RUB": 80.0,
+    "BTC": 100000.0,
+    "ETH": 3000.0
+}
+
+# Срок, в течение которого курс из файла считается свежим
+_RATE_FRESHNESS = timedelta(minutes=5)
+
+# Кеш успешных проверок пароля: время жизни записи (сек) и размер
+_VERIFY_CACHE_TTL = 300
+_VERIFY_CACHE_SIZE = 128
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Атомарно заменяет содержимое файла.
+
+    Данные пишутся во временный файл рядом, сбрасываются на диск (fsync)
+    и только затем переименовываются поверх исходного файла, поэтому сбой
+    посреди записи не оставляет поврежденный файл.
+    """
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Не оставляем недописанный временный файл в каталоге данных
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class _JsonCache:
+    """Разобранное содержимое JSON-файла, перечитываемое только при изменении.
+
+    Файл считается измененным, если поменялись его mtime или размер.
+    Если задан indexer, после каждого чтения файла строится index — его
+    дальнейшую согласованность с данными поддерживает вызывающий код.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        default: Callable[[], Any],
+        indexer: Optional[Callable[[Any], Any]] = None
+    ):
+        self.path = path
+        self.index: Any = None
+        self._default = default
+        self._indexer = indexer
+        self._data: Any = None
+        self._mtime_ns: Optional[int] = None
+        self._size: Optional[int] = None
+
+    def get(self) -> Any:
+        """Возвращает данные файла (default, если файла нет или он поврежден)."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._set_data(self._default(), None, None)
+            return self._data
+
+        if stat.st_mtime_ns != self._mtime_ns or stat.st_size != self._size:
+            try:
+                data = json.loads(self.path.read_bytes())
+            except json.JSONDecodeError:
+                data = self._default()
+            self._set_data(data, stat.st_mtime_ns, stat.st_size)
+        return self._data
+
+    def _set_data(
+        self,
+        data: Any,
+        mtime_ns: Optional[int],
+        size: Optional[int]
+    ) -> None:
+        """Запоминает прочитанные данные и перестраивает индекс."""
+        self._data = data
+        self._mtime_ns = mtime_ns
+        self._size = size
+        if self._indexer is not None:
+            self.index = self._indexer(data)
+
+    def write(self, data: Any) -> None:
+        """Сериализует данные, атомарно записывает их в файл и кеширует.
+
+        Вызывающий код мог уже изменить кешированные данные, поэтому при
+        ошибке записи кеш сбрасывается и следующий get() перечитает файл.
+        """
+        try:
+            payload = json.dumps(
+                data, ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+            _atomic_write_bytes(self.path, payload)
+        except Exception:
+            self._mtime_ns = None
+            self._size = None
+            raise
+        self.store(data)
+
+    def store(self, data: Any) -> None:
+        """Запоминает только что записанные в файл данные."""
+        stat = self.path.stat()
+        self._data = data
+        self._mtime_ns = stat.st_mtime_ns
+        self._size = stat.st_size
+
+
+def _users_list(users_file_data: Any) -> list:
+    """Извлекает список пользователей из содержимого users.json.
+
+    Файл хранит {"next_id": N, "users": [...]}; старый формат — просто список.
+    """
+    if isinstance(users_file_data, dict):
+        return users_file_data.setdefault("users", [])
+    return users_file_data
+
+
+class _UsersIndex:
+    """Индексы пользователей по имени и идентификатору и следующий user_id."""
+
+    def __init__(self, users_file_data: Any):
+        users_data = _users_list(users_file_data)
+        self.by_username = {user["username"]: user for user in users_data}
+        self.by_id = {user["user_id"]: user for user in users_data}
+        self.next_id = max(self.by_id, default=0) + 1
+        if isinstance(users_file_data, dict):
+            self.next_id = max(self.next_id, users_file_data.get("next_id", 1))
+
+    def add(self, user_data: dict) -> None:
+        """Добавляет запись нового пользователя в индексы."""
+        self.by_username[user_data["username"]] = user_data
+        self.by_id[user_data["user_id"]] = user_data
+        self.next_id = max(self.next_id, user_data["user_id"] + 1)
+
+
+@lru_cache(maxsize=256)
+def _parse_timestamp(value: str) -> datetime:
+    """Разбирает метку времени в формате ISO (повторные значения из кеша)."""
+    return datetime.fromisoformat(value)
+
 
 class UserManager:
     """Менеджер для работы с пользователями."""
@@ -13,6 +173,10 @@ class UserManager:
         self.data_dir = Path(data_dir)
         self.users_file = self.data_dir / "users.json"
         self.portfolios_file = self.data_dir / "portfolios.json"
+        self._users_cache = _JsonCache(self.users_file, list, _UsersIndex)
+        self._portfolios_cache = _JsonCache(self.portfolios_file, dict)
+        # (username, sha256(пароля)) -> (хеш из записи, время проверки)
+        self._verify_cache = OrderedDict()
         self._ensure_data_files()
 
     def _ensure_data_files(self) -> None:
@@ -20,63 +184,55 @@ class UserManager:
         self.data_dir.mkdir(exist_ok=True)
 
         if not self.users_file.exists():
-            self.users_file.write_text('[]', encoding='utf-8')
+            _atomic_write_bytes(self.users_file, b'{"next_id":1,"users":[]}')
 
         if not self.portfolios_file.exists():
-            self.portfolios_file.write_text('{}', encoding='utf-8')
+            _atomic_write_bytes(self.portfolios_file, b'{}')
 
     def _load_users(self) -> list:
         """Загружает список пользователей из JSON."""
-        try:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        return _users_list(self._users_cache.get())
 
-    def _save_users(self, users_data: list) -> None:
-        """Сохраняет список пользователей в JSON."""
-        with open(self.users_file, 'w', encoding='utf-8') as f:
-            json.dump(users_data, f, indent=2, ensure_ascii=False)
+    def _save_users(self, users_data: list, next_id: Optional[int] = None) -> None:
+        """Сохраняет список пользователей и счетчик user_id в JSON."""
+        if next_id is None:
+            next_id = self._users_cache.index.next_id
+        self._users_cache.write({"next_id": next_id, "users": users_data})
 
     def _load_portfolios(self) -> dict:
         """Загружает профиль из JSON."""
-        try:
-            with open(self.portfolios_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
+        return self._portfolios_cache.get()
 
     def _save_portfolios(self, portfolios_data: dict) -> None:
         """Сохраняет профиль в JSON."""
-        with open(self.portfolios_file, 'w', encoding='utf-8') as f:
-            json.dump(portfolios_data, f, indent=2, ensure_ascii=False)
+        self._portfolios_cache.write(portfolios_data)
 
     def register_user(self, username: str, password: str) -> User:
         """Регистрирует нового пользователя."""
-        if not username or not username.strip():
+        username = username.strip() if isinstance(username, str) else ""
+        if not username:
             raise ValueError("Имя пользователя не может быть пустым")
 
         if len(password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
 
-        username = username.strip()
         users_data = self._load_users()
+        users_index = self._users_cache.index
 
         # Проверяем уникальность username
-        for user_data in users_data:
-            if user_data["username"] == username:
-                raise ValueError(f"Имя пользователя '{username}' уже занято")
+        if username in users_index.by_username:
+            raise ValueError(f"Имя пользователя '{username}' уже занято")
 
         # Генерируем user_id
-        if users_data:
-            user_id = max(user["user_id"] for user in users_data) + 1
-        else:
-            user_id = 1
+        user_id = users_index.next_id
 
         # Создаем пользователя
         user = User(user_id, username, password)
-        users_data.append(user.to_dict())
-        self._save_users(users_data)
+        user_data = user.to_dict()
+        users_data.append(user_data)
+        self._save_users(users_data, user_id + 1)
+        # Индекс пополняется только после успешной записи файла
+        users_index.add(user_data)
 
         # Создаем пустой профиль
         portfolios_data = self._load_portfolios()
@@ -91,26 +247,72 @@ class UserManager:
             raise ValueError("Имя пользователя и пароль обязательны")
 
         users_data = self._load_users()
+        user_data = self._users_cache.index.by_username.get(username)
+        if user_data is None:
+            raise ValueError(f"Пользователь '{username}' не найден")
+
+        cache_key = (username, hashlib.sha256(password.encode('utf-8')).digest())
+        if self._is_recently_verified(cache_key, user_data):
+            return User.from_dict(user_data)
+
+        user = User.from_dict(user_data)
+        if not user.verify_password(password):
+            raise ValueError("Неверный пароль")
+
+        if user.needs_rehash:
+            # Переводим старый хеш на текущий алгоритм
+            user.change_password(password)
+            user_data.update(user.to_dict())
+            self._save_users(users_data)
+        self._remember_verified(cache_key, user.hashed_password)
+        return user
 
-        for user_data in users_data:
-            if user_data["username"] == username:
-                user = User.from_dict(user_data)
-                if user.verify_password(password):
-                    return user
-                else:
-                    raise ValueError("Неверный пароль")
-
-        raise ValueError(f"Пользователь '{username}' не найден")
+    def _is_recently_verified(
+        self,
+        cache_key: Tuple[str, bytes],
+        user_data: dict
+    ) -> bool:
+        """Проверяет, подтверждался ли этот пароль недавно.
+
+        Запись действительна, пока не истек TTL и хеш пароля в данных
+        пользователя не изменился.
+        """
+        cached = self._verify_cache.get(cache_key)
+        if cached is None:
+            return False
+
+        hashed_password, verified_at = cached
+        if (
+            not hmac.compare_digest(hashed_password, user_data["hashed_password"])
+            or time.monotonic() - verified_at >= _VERIFY_CACHE_TTL
+        ):
+            del self._verify_cache[cache_key]
+            return False
+
+        self._verify_cache.move_to_end(cache_key)
+        return True
+
+    def _remember_verified(
+        self,
+        cache_key: Tuple[str, bytes],
+        hashed_password: str
+    ) -> None:
+        """Запоминает успешную проверку пароля (неудачные не кешируются)."""
+        self._verify_cache[cache_key] = (hashed_password, time.monotonic())
+        self._verify_cache.move_to_end(cache_key)
+        if len(self._verify_cache) > _VERIFY_CACHE_SIZE:
+            self._verify_cache.popitem(last=False)
 
     def get_user_portfolio(self, user_id: int) -> Portfolio:
         """Возвращает профиль пользователя."""
         portfolios_data = self._load_portfolios()
-        user_portfolio_data = portfolios_data.get(str(user_id))
+        user_key = str(user_id)
+        user_portfolio_data = portfolios_data.get(user_key)
 
         if not user_portfolio_data:
             # Создаем пустой профиль, если не существует
             user_portfolio_data = {"wallets": {}}
-            portfolios_data[str(user_id)] = user_portfolio_data
+            portfolios_data[user_key] = user_portfolio_data
             self._save_portfolios(portfolios_data)
 
         return Portfolio.from_dict({
@@ -119,9 +321,14 @@ class UserManager:
         })
 
     def save_user_portfolio(self, portfolio: Portfolio) -> None:
-        """Сохраняет профиль пользователя."""
+        """Сохраняет профиль пользователя (если он изменился)."""
         portfolios_data = self._load_portfolios()
-        portfolios_data[str(portfolio.user_id)] = portfolio.to_dict()
+        user_key = portfolio._user_id_str
+        portfolio_data = portfolio.to_dict()
+        if portfolios_data.get(user_key) == portfolio_data:
+            return
+
+        portfolios_data[user_key] = portfolio_data
         self._save_portfolios(portfolios_data)
 
 
@@ -131,6 +338,13 @@ class CurrencyService:
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
         self.rates_file = self.data_dir / "rates.json"
+        self._rates_cache = _JsonCache(self.rates_file, dict)
+        # (из валюты, в валюту) -> (курс, момент устаревания по time.monotonic)
+        self._rate_cache: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._rate_cache_source: Optional[Mapping[str, Any]] = None
+        # Представление только для чтения над текущими данными кеша файла
+        self._rates_view: Optional[Mapping[str, Any]] = None
+        self._rates_view_data: Optional[dict] = None
         self._ensure_rates_file()
 
     def _ensure_rates_file(self) -> None:
@@ -138,71 +352,142 @@ class CurrencyService:
         self.data_dir.mkdir(exist_ok=True)
 
         if not self.rates_file.exists():
+            now_iso = datetime.now().isoformat()
             initial_rates = {
-                "USD_USD": {"rate": 1.0, "updated_at": datetime.now().isoformat()},
-                "EUR_USD": {"rate": 0.85, "updated_at": datetime.now().isoformat()},
-                "GBP_USD": {"rate": 0.73, "updated_at": datetime.now().isoformat()},
-                "JPY_USD": {"rate": 110.0, "updated_at": datetime.now().isoformat()},
-                "RUB_USD": {"rate": 80.0, "updated_at": datetime.now().isoformat()},
-                "BTC_USD": {"rate": 100000.0, "updated_at": datetime.now().isoformat()},
-                "ETH_USD": {"rate": 3000.0, "updated_at": datetime.now().isoformat()},
+                "USD_USD": {"rate": 1.0, "updated_at": now_iso},
+                "EUR_USD": {"rate": 0.85, "updated_at": now_iso},
+                "GBP_USD": {"rate": 0.73, "updated_at": now_iso},
+                "JPY_USD": {"rate": 110.0, "updated_at": now_iso},
+                "RUB_USD": {"rate": 80.0, "updated_at": now_iso},
+                "BTC_USD": {"rate": 100000.0, "updated_at": now_iso},
+                "ETH_USD": {"rate": 3000.0, "updated_at": now_iso},
                 "source": "stub",
-                "last_refresh": datetime.now().isoformat()
+                "last_refresh": now_iso
             }
             self._save_rates(initial_rates)
 
-    def _load_rates(self) -> dict:
-        """Загружает курсы валют из JSON."""
-        try:
-            with open(self.rates_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
+    def _load_rates(self) -> Mapping[str, Any]:
+        """Загружает курсы валют из JSON (только для чтения).
+
+        Файл перечитывается только при изменении, иначе данные берутся из кеша.
+        Пока данные не менялись, возвращается один и тот же объект
+        представления — по нему _resolve_rate определяет актуальность кеша.
+        """
+        rates_data = self._rates_cache.get()
+        if rates_data is not self._rates_view_data:
+            self._rates_view = MappingProxyType(rates_data)
+            self._rates_view_data = rates_data
+        return self._rates_view
 
     def _save_rates(self, rates_data: dict) -> None:
         """Сохраняет курсы валют в JSON."""
-        with open(self.rates_file, 'w', encoding='utf-8') as f:
-            json.dump(rates_data, f, indent=2, ensure_ascii=False)
+        self._rates_cache.write(rates_data)
 
-    def get_exchange_rate(self, from_currency: str, to_currency: str) -> float:
-        """Возвращает курс обмена между валютами."""
+    def _resolve_rate(
+        self,
+        from_currency: str,
+        to_currency: str,
+        rates_data: Mapping[str, Any],
+        now: datetime
+    ) -> Optional[float]:
+        """Ищет курс в загруженных данных; None, если курс недоступен.
+
+        Найденный курс кешируется до истечения его срока свежести. Кеш
+        сбрасывается, когда меняются сами данные курсов (в том числе после
+        update_exchange_rate или правки файла другим процессом).
+        """
         if from_currency == to_currency:
             return 1.0
 
-        rates_data = self._load_rates()
+        if rates_data is not self._rate_cache_source:
+            self._rate_cache.clear()
+            self._rate_cache_source = rates_data
+
+        cache_key = (from_currency, to_currency)
+        cached = self._rate_cache.get(cache_key)
+        monotonic_now = time.monotonic()
+        if cached is not None and cached[1] > monotonic_now:
+            return cached[0]
+
+        rate, ttl = self._lookup_rate(from_currency, to_currency, rates_data, now)
+        if rate is not None:
+            self._rate_cache[cache_key] = (rate, monotonic_now + ttl)
+        return rate
+
+    def _lookup_rate(
+        self,
+        from_currency: str,
+        to_currency: str,
+        rates_data: Mapping[str, Any],
+        now: datetime
+    ) -> Tuple[Optional[float], float]:
+        """Возвращает курс и сколько секунд он еще считается свежим."""
         pair_key = f"{from_currency}_{to_currency}"
 
         # Прямой курс
         if pair_key in rates_data:
             rate_data = rates_data[pair_key]
             # Проверяем свежесть данных (5 минут)
-            updated_at = datetime.fromisoformat(rate_data["updated_at"])
-            if datetime.now() - updated_at < timedelta(minutes=5):
-                return rate_data["rate"]
+            age = now - _parse_timestamp(rate_data["updated_at"])
+            if age < _RATE_FRESHNESS:
+                return rate_data["rate"], (_RATE_FRESHNESS - age).total_seconds()
 
         # Обратный курс
         reverse_key = f"{to_currency}_{from_currency}"
         if reverse_key in rates_data:
             rate_data = rates_data[reverse_key]
-            updated_at = datetime.fromisoformat(rate_data["updated_at"])
-            if datetime.now() - updated_at < timedelta(minutes=5):
-                return 1.0 / rate_data["rate"]
+            age = now - _parse_timestamp(rate_data["updated_at"])
+            if age < _RATE_FRESHNESS:
+                return (
+                    1.0 / rate_data["rate"],
+                    (_RATE_FRESHNESS - age).total_seconds()
+                )
 
         # Заглушка для демонстрации
-        stub_rates = {
-            "USD": 1.0,
-            "EUR": 0.85,
-            "GBP": 0.73,
-            "JPY": 110.0,
-            "RUB": 80.0,
-            "BTC": 100000.0,
-            "ETH": 3000.0
-        }
+        if from_currency in _STUB_RATES and to_currency in _STUB_RATES:
+            return (
+                _STUB_RATES[to_currency] / _STUB_RATES[from_currency],
+                _RATE_FRESHNESS.total_seconds()
+            )
+
+        return None, 0.0
 
-        if from_currency in stub_rates and to_currency in stub_rates:
-            return stub_rates[to_currency] / stub_rates[from_currency]
+    def get_exchange_rate(
+        self,
+        from_currency: str,
+        to_currency: str,
+        rates_data: Optional[Mapping[str, Any]] = None
+    ) -> float:
+        """Возвращает курс обмена между валютами.
+
+        Уже загруженные курсы можно передать в rates_data, чтобы не читать
+        файл повторно при серии запросов.
+        """
+        if rates_data is None:
+            rates_data = self._load_rates()
+
+        rate = self._resolve_rate(
+            from_currency, to_currency, rates_data, datetime.now()
+        )
+        if rate is None:
+            raise ValueError(f"Курс {from_currency}→{to_currency} недоступен")
+        return rate
+
+    def get_exchange_rates(
+        self,
+        currencies: Iterable[str],
+        to_currency: str
+    ) -> Dict[str, Optional[float]]:
+        """Возвращает курсы нескольких валют к одной за один проход.
 
-        raise ValueError(f"Курс {from_currency}→{to_currency} недоступен")
+        Файл курсов читается один раз; для недоступных курсов значение None.
+        """
+        rates_data = self._load_rates()
+        now = datetime.now()
+        return {
+            currency: self._resolve_rate(currency, to_currency, rates_data, now)
+            for currency in currencies
+        }
 
     def update_exchange_rate(
         self,
@@ -211,14 +496,25 @@ class CurrencyService:
         rate: float
     ) -> None:
         """Обновляет курс валюты в кеше."""
-        rates_data = self._load_rates()
-        pair_key = f"{from_currency}_{to_currency}"
+        self.update_exchange_rates_bulk({(from_currency, to_currency): rate})
 
-        rates_data[pair_key] = {
-            "rate": rate,
-            "updated_at": datetime.now().isoformat()
-        }
-        rates_data["last_refresh"] = datetime.now().isoformat()
+    def update_exchange_rates_bulk(
+        self,
+        updates: Mapping[Tuple[str, str], float]
+    ) -> None:
+        """Обновляет несколько курсов за одно чтение и одну запись файла.
+
+        Ключи updates — пары (из валюты, в валюту), значения — курсы.
+        """
+        rates_data = dict(self._load_rates())
+        now_iso = datetime.now().isoformat()
+
+        for (from_currency, to_currency), rate in updates.items():
+            rates_data[f"{from_currency}_{to_currency}"] = {
+                "rate": rate,
+                "updated_at": now_iso
+            }
+        rates_data["last_refresh"] = now_iso
         rates_data["source"] = "stub"
 
         self._save_rates(rates_data)
@@ -238,11 +534,68 @@ class TradingService:
         amount: float
     ) -> Dict[str, Any]:
         """Покупает валюту для пользователя."""
-        if amount <= 0:
-            raise ValueError("Сумма покупки должна быть положительной")
+        portfolio = self.user_manager.get_user_portfolio(user_id)
+        result = self._buy(portfolio, currency, amount)
+
+        # Сохраняем изменения
+        self.user_manager.save_user_portfolio(portfolio)
+        return result
+
+    def sell_currency(
+        self,
+        user_id: int,
+        currency: str,
+        amount: float
+    ) -> Dict[str, Any]:
+        """Продает валюту пользователя."""
+        portfolio = self.user_manager.get_user_portfolio(user_id)
+        result = self._sell(portfolio, currency, amount)
+
+        # Сохраняем изменения
+        self.user_manager.save_user_portfolio(portfolio)
+        return result
+
+    def batch_trade(
+        self,
+        user_id: int,
+        orders: Iterable[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Выполняет серию сделок и сохраняет портфель один раз.
 
+        Каждая заявка — словарь с ключами action ("buy"/"sell"), currency
+        и amount. Если любая заявка не выполнена, портфель не сохраняется.
+        """
         portfolio = self.user_manager.get_user_portfolio(user_id)
 
+        results = []
+        for order in orders:
+            action = order["action"]
+            if action == "buy":
+                trade = self._buy
+            elif action == "sell":
+                trade = self._sell
+            else:
+                raise ValueError(f"Неизвестная операция: {action}")
+            result = trade(portfolio, order["currency"], order["amount"])
+            result["action"] = action
+            results.append(result)
+
+        # Сохраняем изменения один раз для всей серии
+        self.user_manager.save_user_portfolio(portfolio)
+        return results
+
+    def _buy(
+        self,
+        portfolio: Portfolio,
+        currency: str,
+        amount: float
+    ) -> Dict[str, Any]:
+        """Выполняет покупку в портфеле без сохранения."""
+        if not math.isfinite(amount) or amount <= 0:
+            raise ValueError("Сумма покупки должна быть положительной")
+
+        currency = canonical_code(currency)
+
         # Получаем текущий курс
         try:
             rate = self.currency_service.get_exchange_rate(currency, "USD")
@@ -254,30 +607,28 @@ class TradingService:
         if not success:
             raise ValueError("Недостаточно средств в USD кошельке")
 
-        # Сохраняем изменения
-        self.user_manager.save_user_portfolio(portfolio)
-
+        new_balance = portfolio.get_wallet(currency).balance
         return {
             "success": True,
             "currency": currency,
             "amount": amount,
             "rate": rate,
             "total_cost": amount * rate,
-            "old_balance": portfolio.get_wallet(currency).balance - amount,
-            "new_balance": portfolio.get_wallet(currency).balance
+            "old_balance": new_balance - amount,
+            "new_balance": new_balance
         }
 
-    def sell_currency(
+    def _sell(
         self,
-        user_id: int,
+        portfolio: Portfolio,
         currency: str,
         amount: float
     ) -> Dict[str, Any]:
-        """Продает валюту пользователя."""
-        if amount <= 0:
+        """Выполняет продажу в портфеле без сохранения."""
+        if not math.isfinite(amount) or amount <= 0:
             raise ValueError("Сумма продажи должна быть положительной")
 
-        portfolio = self.user_manager.get_user_portfolio(user_id)
+        currency = canonical_code(currency)
 
         # Проверяем существование кошелька
         wallet = portfolio.get_wallet(currency)
@@ -302,64 +653,81 @@ class TradingService:
         if not success:
             raise ValueError("Ошибка при выполнении продажи")
 
-        # Сохраняем изменения
-        self.user_manager.save_user_portfolio(portfolio)
-
+        new_balance = wallet.balance
         return {
             "success": True,
             "currency": currency,
             "amount": amount,
             "rate": rate,
             "total_income": amount * rate,
-            "old_balance": wallet.balance + amount,
-            "new_balance": wallet.balance
+            "old_balance": new_balance + amount,
+            "new_balance": new_balance
         }
 
+    def revalue_portfolio(
+        self,
+        portfolio: Portfolio,
+        base_currency: str
+    ) -> Dict[str, Optional[float]]:
+        """Оценивает все кошельки портфеля в базовой валюте.
+
+        Возвращает стоимость по коду валюты; None, если курс недоступен.
+        """
+        wallets = portfolio.wallets
+        rates = self.currency_service.get_exchange_rates(wallets, base_currency)
+        return {
+            currency_code: (
+                None if rates[currency_code] is None
+                else wallet.balance * rates[currency_code]
+            )
+            for currency_code, wallet in wallets.items()
+        }
+
+
 class SessionManager:
     """Менеджер для управления сессиями пользователей."""
 
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
         self.session_file = self.data_dir / "session.json"
+        self._session_cache = _JsonCache(self.session_file, dict)
         self._ensure_session_file()
 
     def _ensure_session_file(self) -> None:
         """Создает файл сессии, если он не существует."""
         self.data_dir.mkdir(exist_ok=True)
         if not self.session_file.exists():
-            self.session_file.write_text('{}', encoding='utf-8')
+            _atomic_write_bytes(self.session_file, b'{}')
 
     def create_session(self, user_id: int, username: str) -> None:
         """Создает сессию для пользователя."""
+        now = datetime.now()
         session_data = {
             "user_id": user_id,
             "username": username,
-            "created_at": datetime.now().isoformat(),
-            "expires_at": (datetime.now() + timedelta(hours=24)).isoformat()
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(hours=24)).isoformat()
         }
-        with open(self.session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2)
+        self._session_cache.write(session_data)
 
     def get_current_session(self) -> Dict[str, Any]:
         """Возвращает текущую активную сессию."""
         try:
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
+            session_data = self._session_cache.get()
 
             # Проверяем срок действия сессии
-            expires_at = datetime.fromisoformat(session_data["expires_at"])
+            expires_at = _parse_timestamp(session_data["expires_at"])
             if datetime.now() > expires_at:
                 self.clear_session()
                 return {}
 
             return session_data
-        except (json.JSONDecodeError, FileNotFoundError, KeyError):
+        except KeyError:
             return {}
 
     def clear_session(self) -> None:
         """Очищает текущую сессию."""
-        with open(self.session_file, 'w', encoding='utf-8') as f:
-            json.dump({}, f, indent=2)
+        self._session_cache.write({})
 
     def is_session_active(self) -> bool:
         """Проверяет, есть ли активная сессия."""
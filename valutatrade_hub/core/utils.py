@@ -1,24 +1,37 @@
 """Вспомогательные функции для работы с валютами."""
 
+from functools import lru_cache
 from typing import Optional
-from .currencies import get_currency, CurrencyNotFoundError
+from .currencies import (
+    canonical_code,
+    get_all_currencies,
+    get_currency,
+    CurrencyNotFoundError,
+)
 from .exceptions import InvalidCurrencyError
 
 
 def validate_currency_code(code: str) -> bool:
     """Проверяет валидность кода валюты."""
-    try:
-        get_currency(code)
-        return True
-    except CurrencyNotFoundError:
-        return False
+    # Проверка по реестру без исключений; не кешируется, так как реестр
+    # может пополняться через register_currency
+    return isinstance(code, str) and canonical_code(code) in get_all_currencies()
 
 
 def normalize_currency_code(code: str) -> str:
     """Нормализует код валюты (приводит к верхнему регистру)."""
-    if not isinstance(code, str) or not code.strip():
+    if not isinstance(code, str):
+        raise InvalidCurrencyError("Код валюты должен быть непустой строкой")
+    return _normalize_code(code)
+
+
+@lru_cache(maxsize=512)
+def _normalize_code(code: str) -> str:
+    """Обрезает пробелы и приводит строку кода к верхнему регистру."""
+    normalized = code.strip().upper()
+    if not normalized:
         raise InvalidCurrencyError("Код валюты должен быть непустой строкой")
-    return code.upper().strip()
+    return normalized
 
 
 def get_currency_display_info(code: str) -> Optional[str]: